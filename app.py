@@ -1,23 +1,115 @@
-from flask import Flask, render_template, request, jsonify
+# Imported first on purpose: it forks its HTML parsing workers at import,
+# which is only safe before any threads, models or event loops exist.
+from services.news_fetcher import fetch_all_articles
+
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 import asyncio
-import markdown2
+import atexit
+import os
+from functools import lru_cache
+import threading
+import httpx
+from cmarkgfm import github_flavored_markdown_to_html
+import numpy as np
+import orjson
 import time 
 
 # --- Caching Imports ---
 from flask_caching import Cache
 
 # --- Our Services ---
-from services.news_fetcher import fetch_all_articles 
-from services.clustering_service import group_by_theme
+from services.clustering_service import group_by_theme, embed_worker
 # --- IMPORT ALL OUR NEW RAG FUNCTIONS ---
-from services.rag_service import get_summary_report, get_timeline, get_contradictions
+from services.rag_service import get_summary_report, stream_summary_report, get_timeline, get_contradictions, get_all_reports
 
 app = Flask(__name__)
 
+# --- Fast JSON ---
+# orjson is a C extension and serializes our big HTML-filled responses
+# several times faster than the standard json module. It also handles
+# numpy types directly.
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+app.json = OrjsonProvider(app)
+
 # --- Configure Caching ---
-app.config["CACHE_TYPE"] = "simple"
+# With REDIS_URL set, the cache lives in Redis: every gunicorn worker shares
+# it and it survives restarts. Without it we fall back to a per-process cache.
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    app.config["CACHE_TYPE"] = "RedisCache"
+    app.config["CACHE_REDIS_URL"] = REDIS_URL
+else:
+    app.config["CACHE_TYPE"] = "simple"
 cache = Cache(app)
 
+# --- Shared Async Resources ---
+# One event loop runs on a background thread for the lifetime of the app.
+# The HTTP client lives on that loop, so its connection pool (and the
+# TCP/TLS sessions to NewsAPI and news sites) is reused across requests.
+loop = asyncio.new_event_loop()
+threading.Thread(target=loop.run_forever, name="async-loop", daemon=True).start()
+
+def run_async(coro):
+    """
+    Runs a coroutine on the shared background loop and waits for its result.
+    Use this from Flask handlers instead of asyncio.run().
+    """
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+def iter_async(agen):
+    """
+    Iterates an async generator on the shared background loop, one item
+    at a time, from sync code (e.g. a streaming Flask response).
+    """
+    try:
+        while True:
+            try:
+                yield run_async(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        # Client went away mid-stream: stop the generator on its own loop
+        run_async(agen.aclose())
+
+async def _create_http_client():
+    # Idle connections are kept for 5 minutes (httpx's default is 5 seconds).
+    # httpx has no DNS cache, so a pooled connection is what saves us the
+    # DNS lookup (and handshake) when the same news host comes up again.
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=300.0),
+        timeout=10.0,
+    )
+
+http_client = run_async(_create_http_client())
+
+@atexit.register
+def _shutdown_async_resources():
+    # Close pooled connections cleanly, then stop the loop
+    try:
+        run_async(http_client.aclose())
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+
+
+async def _fetch_and_embed(query):
+    """
+    Fetches the articles and embeds them *as they arrive*, so the
+    embedding work overlaps with the network wait instead of following it.
+    """
+    text_queue = asyncio.Queue(maxsize=64)
+    worker = asyncio.create_task(embed_worker(text_queue))
+    try:
+        return await fetch_all_articles(http_client, query, text_queue=text_queue)
+    finally:
+        await text_queue.put(None)
+        await worker
+
 
 # --- START: NEW CACHED DATA FUNCTION ---
 @cache.memoize(timeout=600) # Cache results for 10 minutes
@@ -31,7 +123,7 @@ def get_cached_article_data(query):
     
     # --- Step 1: Fetch ---
     try:
-        articles = asyncio.run(fetch_all_articles(query))
+        articles = run_async(_fetch_and_embed(query))
     except Exception as e:
         print(f"[ERROR] Async fetch failed: {e}")
         return None, None # Return None on error
@@ -40,16 +132,15 @@ def get_cached_article_data(query):
         return [], [] # Return empty lists if no articles found
 
     # --- Step 2: Cluster ---
+    # (Embeddings were already computed during the fetch; this is mostly DBSCAN)
     articles = group_by_theme(articles)
 
     # --- Step 3: Build "Related Links" ---
-    unique_themes = {}
-    for article in articles:
-        theme = article.get('theme_id', -1)
-        if theme != -1 and theme not in unique_themes:
-            unique_themes[theme] = article
-            
-    top_themed_articles = list(unique_themes.values())[:5]
+    # The first article of each theme (in article order), top 5 themes
+    theme_ids = np.fromiter((a.get('theme_id', -1) for a in articles), dtype=np.int32, count=len(articles))
+    themed_idx = np.flatnonzero(theme_ids != -1)
+    _, first_idx = np.unique(theme_ids[themed_idx], return_index=True)
+    top_themed_articles = [articles[i] for i in themed_idx[np.sort(first_idx)][:5]]
     
     related_links = [
         {
@@ -66,6 +157,22 @@ def get_cached_article_data(query):
 # --- END: NEW CACHED DATA FUNCTION ---
 
 
+@lru_cache(maxsize=2048)
+def render_markdown(text):
+    """
+    Markdown -> HTML with cmark-gfm (C library). Raw HTML and unsafe links
+    in the LLM output are stripped by cmark's default safe mode.
+    Identical answers (e.g. the same report requested again) are only rendered once.
+    """
+    return github_flavored_markdown_to_html(text)
+
+def _json_field(key, value, last=False):
+    """
+    One '"key":value' member of a streamed JSON object.
+    """
+    return f"{app.json.dumps(key)}:{app.json.dumps(value)}" + ("" if last else ",")
+
+
 # --- START: ENDPOINT DEFINITIONS ---
 
 @app.route("/")
@@ -91,20 +198,64 @@ def query():
     if not articles:
         return jsonify({"error": "No articles found"}), 404
 
-    # --- Run the RAG summary ---
-    # This is fast, so we don't cache it
-    rag_data = get_summary_report(query, articles) 
+    # --- Stream the JSON Response ---
+    # The related links are ready now, but the RAG summary takes a while.
+    # We send the JSON object piece by piece, so the fields we already have
+    # go out immediately instead of waiting for the whole response.
+    def generate():
+        yield "{"
+        yield _json_field("related_links", related_links)
+        yield _json_field("total_articles_found", len(articles))
 
-    # --- Assemble Final JSON Response ---
-    final_response = {
-        "summary_html": markdown2.markdown(rag_data.get("answer", "No answer generated.")),
-        "cited_sources": rag_data.get("sources", []),
-        "related_links": related_links,
-        "total_articles_found": len(articles),
-        "time_taken": f"{time.time() - start_time:.2f}s"
-    }
-    
-    return jsonify(final_response)
+        # --- Run the RAG summary ---
+        # This is fast, so we don't cache it
+        rag_data = run_async(get_summary_report(query, articles))
+
+        yield _json_field("summary_html", render_markdown(rag_data.get("answer", "No answer generated.")))
+        yield _json_field("cited_sources", rag_data.get("sources", []))
+        yield _json_field("time_taken", f"{time.time() - start_time:.2f}s", last=True)
+        yield "}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+# 1b. Streaming Summary Endpoint (Server-Sent Events)
+@app.route("/api/summary/stream", methods=["POST"])
+def api_summary_stream():
+    start_time = time.time()
+    data = request.get_json()
+    query = data.get("query")
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+
+    print(f"[INFO] API/Summary stream received: {query}")
+
+    # --- Get data from cache ---
+    articles, _ = get_cached_article_data(query)
+
+    if articles is None:
+        return jsonify({"error": "Failed to fetch articles"}), 500
+    if not articles:
+        return jsonify({"error": "No articles found"}), 404
+
+    # --- Stream the summary as Gemini writes it ---
+    # Each "token" event carries the next piece of raw markdown, so the user
+    # sees the first words after the first token instead of the whole answer.
+    # The final "done" event has the rendered HTML and the sources.
+    def generate():
+        for event in iter_async(stream_summary_report(query, articles)):
+            if "token" in event:
+                yield f"event: token\ndata: {app.json.dumps(event['token'])}\n\n"
+            else:
+                done = {
+                    "summary_html": render_markdown(event.get("answer", "No answer generated.")),
+                    "cited_sources": event.get("sources", []),
+                    "time_taken": f"{time.time() - start_time:.2f}s"
+                }
+                yield f"event: done\ndata: {app.json.dumps(done)}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 # 2. NEW: Timeline Endpoint
@@ -127,12 +278,12 @@ def api_timeline():
         return jsonify({"error": "No articles found"}), 404
         
     # --- Run the TIMELINE RAG query ---
-    rag_data = get_timeline(query, articles)
+    rag_data = run_async(get_timeline(query, articles))
     
     # Format and return
     response = {
         "query": query,
-        "timeline_html": markdown2.markdown(rag_data.get("answer")),
+        "timeline_html": render_markdown(rag_data.get("answer")),
         "cited_sources": rag_data.get("sources"),
         "time_taken": f"{time.time() - start_time:.2f}s"
     }
@@ -159,17 +310,55 @@ def api_contradictions():
         return jsonify({"error": "No articles found"}), 404
         
     # --- Run the CONTRADICTIONS RAG query ---
-    rag_data = get_contradictions(query, articles)
+    rag_data = run_async(get_contradictions(query, articles))
     
     # Format and return
     response = {
         "query": query,
-        "analysis_html": markdown2.markdown(rag_data.get("answer")),
+        "analysis_html": render_markdown(rag_data.get("answer")),
         "cited_sources": rag_data.get("sources"),
         "time_taken": f"{time.time() - start_time:.2f}s"
     }
     return jsonify(response)
 
+
+# 4. NEW: All Reports Endpoint (summary + timeline + contradictions in one go)
+@app.route("/api/reports", methods=["POST"])
+def api_reports():
+    start_time = time.time()
+    data = request.get_json()
+    query = data.get("query")
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+
+    print(f"[INFO] API/Reports query received: {query}")
+
+    # --- Get data from cache ---
+    articles, related_links = get_cached_article_data(query)
+
+    if articles is None:
+        return jsonify({"error": "Failed to fetch articles"}), 500
+    if not articles:
+        return jsonify({"error": "No articles found"}), 404
+
+    # --- Run all three RAG queries over one vector store ---
+    reports = run_async(get_all_reports(query, articles))
+
+    # Format and return
+    response = {
+        "query": query,
+        "summary_html": render_markdown(reports["report"].get("answer")),
+        "cited_sources": reports["report"].get("sources"),
+        "timeline_html": render_markdown(reports["timeline"].get("answer")),
+        "timeline_sources": reports["timeline"].get("sources"),
+        "analysis_html": render_markdown(reports["contradictions"].get("answer")),
+        "analysis_sources": reports["contradictions"].get("sources"),
+        "related_links": related_links,
+        "total_articles_found": len(articles),
+        "time_taken": f"{time.time() - start_time:.2f}s"
+    }
+    return jsonify(response)
+
 # --- END: ENDPOINT DEFINITIONS ---
 
 if __name__ == "__main__":
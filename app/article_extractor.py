@@ -1,25 +1,129 @@
-from newspaper import Article
+import asyncio
+import lxml.html
 import trafilatura
+from .config import REDIS_URL
 
-def extract_text(url):
+# --- Extraction Cache ---
+# Breaking-news queries keep returning the same URLs. When Redis is
+# configured we keep each URL's extracted text for an hour, shared by
+# every worker, so a repeat URL costs one Redis GET instead of a download.
+EXTRACT_CACHE_TTL = 3600
+EXTRACT_CACHE_PREFIX = "extract:"
+
+try:
+    from redis import asyncio as aioredis
+    _cache = aioredis.from_url(REDIS_URL) if REDIS_URL else None
+except ImportError:
+    _cache = None
+
+# --- Download Limits ---
+# A news link can point at a 50MB PDF or a server that never finishes.
+# We only read HTML, give up after 5 seconds, and stop reading after 2MB
+# (the article body is always well inside that).
+MAX_HTML_BYTES = 2_000_000
+FETCH_TIMEOUT = 5.0
+
+async def _read_html(client, url):
+    async with client.stream("GET", url, follow_redirects=True) as response:
+        response.raise_for_status()
+
+        if "html" not in response.headers.get("content-type", ""):
+            return ""
+        length = response.headers.get("content-length")
+        if length and length.isdigit() and int(length) > MAX_HTML_BYTES:
+            return ""
+
+        body = bytearray()
+        async for chunk in response.aiter_bytes(65536):
+            body.extend(chunk)
+            if len(body) >= MAX_HTML_BYTES:
+                break
+        return body.decode(response.encoding or "utf-8", errors="replace")
+
+async def fetch_html(client, url, timeout=FETCH_TIMEOUT):
+    """
+    Download the raw HTML of an article using a shared async client.
+    Non-HTML, oversized or slow responses give "".
+    """
+    try:
+        return await asyncio.wait_for(_read_html(client, url), timeout)
+    except Exception:
+        return ""
+
+def _extract_fast(tree):
+    """
+    Returns the paragraphs of the element holding the most <p> text -
+    the article body on nearly every news page.
+    """
+    paragraph_chars = {}
+    for p in tree.iter("p"):
+        parent = p.getparent()
+        if parent is not None:
+            paragraph_chars[parent] = paragraph_chars.get(parent, 0) + len(p.text_content().strip())
+
+    if not paragraph_chars:
+        return ""
+
+    body = max(paragraph_chars, key=paragraph_chars.get)
+    paragraphs = (p.text_content().strip() for p in body.iterchildren("p"))
+    return "\n\n".join(p for p in paragraphs if p)
+
+def parse_html(html, url=""):
     """
-    Extract article text with Newspaper3k first, then Trafilatura fallback.
+    Extract article text from already-downloaded HTML.
+    The HTML is parsed once with lxml; the fast paragraph extractor runs
+    first, then Trafilatura on the same tree as a fallback.
     """
+    if not html:
+        return ""
+
     try:
-        art = Article(url)
-        art.download()
-        art.parse()
-        if len(art.text) > 300:
-            return art.text
+        tree = lxml.html.fromstring(html, base_url=url or None)
     except:
-        pass
+        # e.g. XHTML pages: lxml refuses a str with an XML encoding
+        # declaration. Trafilatura still copes with the raw HTML.
+        tree = None
+
+    if tree is not None:
+        try:
+            text = _extract_fast(tree)
+            if len(text) > 300:
+                return text
+        except:
+            pass
 
     try:
-        downloaded = trafilatura.fetch_url(url)
-        extracted = trafilatura.extract(downloaded)
+        extracted = trafilatura.extract(tree if tree is not None else html)
         if extracted and len(extracted) > 300:
             return extracted
     except:
         pass
 
     return ""
+
+async def extract_text(client, url, executor=None):
+    """
+    Download + parse one article, using the Redis cache when available.
+    Parsing runs on 'executor' so it doesn't block the event loop.
+    """
+    key = EXTRACT_CACHE_PREFIX + url
+    if _cache is not None:
+        try:
+            cached = await _cache.get(key)
+            if cached is not None:
+                return cached.decode("utf-8")
+        except Exception as e:
+            print(f"[WARN] Extract cache read failed: {e}")
+
+    html = await fetch_html(client, url)
+    loop = asyncio.get_running_loop()
+    text = await loop.run_in_executor(executor, parse_html, html, url)
+
+    # Only cache real results - an empty string may be a temporary failure
+    if text and _cache is not None:
+        try:
+            await _cache.set(key, text, ex=EXTRACT_CACHE_TTL)
+        except Exception as e:
+            print(f"[WARN] Extract cache write failed: {e}")
+
+    return text
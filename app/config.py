@@ -5,3 +5,4 @@ load_dotenv()
 
 GNEWS_API_KEY = os.getenv("GNEWS_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+REDIS_URL = os.getenv("REDIS_URL")
@@ -1,17 +1,17 @@
+import asyncio
 import google.generativeai as genai
 from .config import GEMINI_API_KEY
 
 genai.configure(api_key=GEMINI_API_KEY)
 
-def summarize_with_gemini(query, article_text): # <-- Renamed combined_text
-    """
-    Summarize a single article's text using Gemini API.
-    """
-    model = genai.GenerativeModel("gemini-2.5-flash")
+# Max Gemini requests in flight at once (keeps us under the rate limit)
+GEMINI_CONCURRENCY = 8
+_gemini_semaphore = asyncio.Semaphore(GEMINI_CONCURRENCY)
 
+def _build_prompt(query, article_text):
     # --- THIS IS THE NEW PROMPT ---
     # It's now focused on summarizing one article
-    prompt = f"""
+    return f"""
     Provide a detail and insightful summary in depth of the following article, focusing on all
     its key points and relevance to the topic: '{query}'.
 
@@ -24,5 +24,19 @@ def summarize_with_gemini(query, article_text): # <-- Renamed combined_text
     {article_text[:15000]}
     """
 
-    response = model.generate_content(prompt)
-    return response.text
\ No newline at end of file
+def summarize_with_gemini(query, article_text): # <-- Renamed combined_text
+    """
+    Summarize a single article's text using Gemini API.
+    """
+    model = genai.GenerativeModel("gemini-2.5-flash")
+    response = model.generate_content(_build_prompt(query, article_text))
+    return response.text
+
+async def summarize_with_gemini_async(query, article_text):
+    """
+    Async version of summarize_with_gemini, so many articles can be summarized at once.
+    """
+    model = genai.GenerativeModel("gemini-2.5-flash")
+    async with _gemini_semaphore:
+        response = await model.generate_content_async(_build_prompt(query, article_text))
+    return response.text
@@ -1,12 +1,12 @@
-import requests
 from .config import GNEWS_API_KEY
 
-def fetch_news(query, max_results=3):
+async def fetch_news(client, query, max_results=3):
     """
     Fetch news articles from GNews API related to the query.
     """
-    url = f"https://gnews.io/api/v4/search?q={query}&lang=en&max={max_results}&token={GNEWS_API_KEY}"
-    response = requests.get(url)
+    url = "https://gnews.io/api/v4/search"
+    params = {"q": query, "lang": "en", "max": max_results, "token": GNEWS_API_KEY}
+    response = await client.get(url, params=params)
     data = response.json()
 
     if "articles" not in data:
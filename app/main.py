@@ -1,26 +1,58 @@
-from fastapi import FastAPI
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import httpx
+from fastapi import FastAPI, Request
 from .gnews_fetcher import fetch_news
 from .article_extractor import extract_text
-from .gemini_summarizer import summarize_with_gemini
+from .gemini_summarizer import summarize_with_gemini_async
 from .response_formatter import format_response
 
-app = FastAPI(title="AI News Intelligence")
+USER_AGENT = "Mozilla/5.0 (compatible; AI-News-Intelligence/1.0)"
+
+@asynccontextmanager
+async def lifespan(app):
+    # One HTTP/2 client for the whole app. Its pool keeps connections to
+    # GNews and the news sites open between requests, so repeat hosts
+    # skip the TCP + TLS handshake.
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=10.0,
+        headers={"user-agent": USER_AGENT},
+    )
+    yield
+    await app.state.http.aclose()
+
+app = FastAPI(title="AI News Intelligence", lifespan=lifespan)
+
+# Parsing is CPU-bound, so it runs off the event loop
+parse_executor = ThreadPoolExecutor(max_workers=8)
 
 @app.get("/news")
-def get_news(query: str):
-    articles = fetch_news(query)
+async def get_news(query: str, request: Request):
+    client = request.app.state.http
+    articles = await fetch_news(client, query)
     if not articles:
         return {"error": "No news articles found."}
 
-    combined_text = ""
-    for a in articles:
-        text = extract_text(a["url"])
-        if text:
-            combined_text += text + "\n\n"
+    # Download every article at once instead of one after another
+    tasks = [extract_text(client, a["url"], parse_executor) for a in articles]
+    texts = await asyncio.gather(*tasks, return_exceptions=True)
 
-    if not combined_text:
+    texts = [text for text in texts if isinstance(text, str) and text]
+    if not texts:
         return {"error": "Failed to extract text from all articles."}
 
-    summary = summarize_with_gemini(query, combined_text)
+    # Summarize each article on its own, all at the same time
+    results = await asyncio.gather(
+        *[summarize_with_gemini_async(query, text) for text in texts],
+        return_exceptions=True
+    )
+    summaries = [r for r in results if isinstance(r, str) and r]
+    if not summaries:
+        return {"error": "Failed to summarize the articles."}
+
+    summary = "\n\n".join(summaries)
     response = format_response(query, summary, articles)
     return response
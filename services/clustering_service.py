@@ -1,20 +1,219 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 import numpy as np
+from scipy.sparse import csr_matrix
 from sentence_transformers import SentenceTransformer
 from sklearn.cluster import DBSCAN
 import time
+from services.dedup import NearDuplicateIndex
+
+# --- Optional Numba Kernel ---
+# Only used for large article sets; without Numba we always use the
+# dense distance matrix, which is fine for the usual 30-200 articles.
+try:
+    from services._cluster_kernels import neighbor_graph
+except ImportError:
+    print("[WARN] Numba not available. Using dense distances for all sizes.")
+    neighbor_graph = None
+
+# --- Optional ANN Index ---
+# For very large article sets even the sparse scan is O(N^2). hnswlib
+# gives us approximate nearest neighbors in sub-linear time per article.
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
 
 # --- Initialize Model ---
 # We load the model *once* when the app starts, not every time
 # the function is called. This saves a lot of time.
 # 'all-MiniLM-L6-v2' is a great, fast model for this.
+# We run it on ONNX Runtime using the int8-quantized export that ships with
+# the model (much faster on CPU than eager PyTorch). If ONNX Runtime isn't
+# installed we fall back to the regular PyTorch model.
+ONNX_MODEL_FILE = os.getenv("ONNX_MODEL_FILE", "onnx/model_quint8_avx2.onnx")
+
 try:
     print("[INFO] Loading sentence-transformer model...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    try:
+        model = SentenceTransformer(
+            'all-MiniLM-L6-v2',
+            device='cpu',
+            backend='onnx',
+            model_kwargs={"file_name": ONNX_MODEL_FILE, "provider": "CPUExecutionProvider"}
+        )
+    except Exception as e:
+        print(f"[WARN] ONNX model unavailable ({e}). Falling back to PyTorch.")
+        model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
+
+    # Warm-up: the first encode pays for lazy setup (thread pools, tokenizer
+    # caches). Do it now so the first user query doesn't.
+    model.encode(["warmup"] * 2, show_progress_bar=False)
     print("[INFO] Model loaded successfully.")
 except Exception as e:
     print(f"[ERROR] Failed to load model: {e}")
     model = None
 
+# DBSCAN settings.
+# 'eps' is the "distance" to consider for a cluster.
+# 'min_samples=2' means a theme needs at least 2 articles.
+DBSCAN_EPS = 0.25
+DBSCAN_MIN_SAMPLES = 2
+
+# Above this many articles we build a sparse eps-neighbor graph instead of
+# the full N x N distance matrix.
+SPARSE_GRAPH_MIN_ARTICLES = 500
+
+# Above this many articles we only look at each article's approximate
+# nearest neighbors (hnswlib) instead of comparing every pair.
+ANN_GRAPH_MIN_ARTICLES = 5000
+ANN_NEIGHBORS = 16
+
+# We only cluster articles with more text than this
+MIN_TEXT_LENGTH = 50
+
+# Background embedding: encode in batches of this size, or whatever has
+# arrived once the scraper has been quiet for this long.
+EMBED_BATCH_SIZE = 32
+EMBED_FLUSH_SECONDS = 0.1
+
+# --- Embedding Cache ---
+# The same articles show up again and again for related queries, and
+# encoding is the most expensive CPU step here. We remember embeddings
+# by a hash of the article text, so only *new* articles hit the model.
+EMBEDDING_CACHE_SIZE = 10000
+_embedding_cache = OrderedDict()
+_embedding_cache_lock = threading.Lock() # Flask serves requests on threads
+
+def _text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def embed(texts, keys=None):
+    """
+    Returns an (n, dim) float32 array of L2-normalized embeddings for 'texts'.
+    Cached vectors are reused; the model only encodes the missing ones.
+    """
+    if keys is None:
+        keys = [_text_key(text) for text in texts]
+
+    n = len(texts)
+    dim = model.get_sentence_embedding_dimension()
+    output = np.empty((n, dim), dtype=np.float32)
+
+    # 1. Look up everything we already have
+    missing_idx = []
+    with _embedding_cache_lock:
+        for i, key in enumerate(keys):
+            vector = _embedding_cache.get(key)
+            if vector is None:
+                missing_idx.append(i)
+            else:
+                _embedding_cache.move_to_end(key)
+                output[i] = vector
+
+    if not missing_idx:
+        return output
+
+    # 2. Encode only the missing texts, in one batched call
+    print(f"[INFO] Embedding cache: {n - len(missing_idx)} hits, {len(missing_idx)} misses.")
+    new_vectors = model.encode(
+        [texts[i] for i in missing_idx],
+        batch_size=64,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    ).astype(np.float32)
+
+    # 3. Store the new vectors and drop the least recently used ones
+    with _embedding_cache_lock:
+        for i, vector in zip(missing_idx, new_vectors):
+            output[i] = vector
+            _embedding_cache[keys[i]] = vector
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+    return output
+
+async def embed_worker(queue):
+    """
+    Embeds article texts while the rest are still being scraped.
+    Reads texts from 'queue' (None means "no more") and fills the embedding
+    cache, so group_by_theme later finds every vector already computed.
+    """
+    # No near-duplicate filtering here: texts arrive in scrape-completion
+    # order, while group_by_theme keeps the first copy in article order.
+    # Skipping a repost here could skip the copy it ends up embedding.
+    batch = []
+    done = False
+
+    while not done:
+        timed_out = False
+        try:
+            text = await asyncio.wait_for(queue.get(), EMBED_FLUSH_SECONDS)
+            if text is None:
+                done = True
+            elif model is not None and text and len(text) > MIN_TEXT_LENGTH:
+                batch.append(text)
+        except asyncio.TimeoutError:
+            timed_out = True
+
+        if batch and (done or timed_out or len(batch) >= EMBED_BATCH_SIZE):
+            try:
+                await asyncio.to_thread(embed, batch)
+            except Exception as e:
+                print(f"[ERROR] Background embedding failed: {e}")
+            batch = []
+
+def _ann_distance_graph(embeddings):
+    """
+    Sparse eps-neighbor graph from an HNSW index: each article is only
+    compared with its ANN_NEIGHBORS approximate nearest neighbors.
+    """
+    n, dim = embeddings.shape
+    k = min(ANN_NEIGHBORS, n)
+
+    index = hnswlib.Index(space='cosine', dim=dim)
+    index.init_index(max_elements=n, ef_construction=100, M=16)
+    index.add_items(embeddings, np.arange(n))
+    index.set_ef(max(50, k))
+    neighbors, dists = index.knn_query(embeddings, k=k)
+
+    # Keep pairs within eps. Distances are floored above zero so sparse
+    # math below can't drop exact duplicates as "missing" entries.
+    mask = dists <= DBSCAN_EPS
+    rows = np.repeat(np.arange(n), k).reshape(n, k)[mask]
+    graph = csr_matrix((np.maximum(dists[mask], 1e-8), (rows, neighbors[mask])), shape=(n, n))
+
+    # k-NN isn't symmetric; DBSCAN's neighborhoods must be
+    return graph.maximum(graph.T)
+
+def _distance_matrix(embeddings):
+    """
+    Builds what DBSCAN(metric='precomputed') needs from normalized embeddings.
+    """
+    n = len(embeddings)
+
+    if hnswlib is not None and n >= ANN_GRAPH_MIN_ARTICLES:
+        # Approximate: only nearest neighbors are considered
+        return _ann_distance_graph(embeddings)
+
+    if neighbor_graph is not None and n >= SPARSE_GRAPH_MIN_ARTICLES:
+        # Sparse: only pairs closer than eps are stored
+        rows, cols, dists = neighbor_graph(embeddings, DBSCAN_EPS)
+        return csr_matrix(
+            (np.concatenate([dists, dists]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+            shape=(n, n)
+        )
+
+    # Dense: the embeddings are L2-normalized, so cosine distance is simply
+    # 1 - (dot product). One matrix multiply gives us every pair at once.
+    distances = 1.0 - embeddings @ embeddings.T
+    np.clip(distances, 0.0, 2.0, out=distances)
+    return distances
+
 def group_by_theme(articles):
     """
     Takes a list of article objects and adds a 'theme_id' to each.
@@ -46,7 +245,7 @@ def group_by_theme(articles):
         content = article.get('full_text') 
 
         # We only cluster articles with a decent amount of text
-        if content and len(content) > 50:
+        if content and len(content) > MIN_TEXT_LENGTH:
             articles_to_cluster.append((i, content))
 
     if not articles_to_cluster:
@@ -56,11 +255,24 @@ def group_by_theme(articles):
     # Unzip the list into separate lists for indices and texts
     original_indices, texts = zip(*articles_to_cluster)
 
+    # --- 1b. Drop Near-Duplicates ---
+    # The same wire story often comes back from many outlets. We only
+    # embed and cluster one copy, weighted by how many copies it has.
+    duplicates = NearDuplicateIndex()
+    representatives = [duplicates.add(text) for text in texts]
+    unique_positions = [i for i, rep in enumerate(representatives) if rep == i]
+    row_of = {pos: row for row, pos in enumerate(unique_positions)}
+    weights = np.bincount([row_of[rep] for rep in representatives], minlength=len(unique_positions))
+
+    if len(unique_positions) < len(texts):
+        print(f"[INFO] Skipping {len(texts) - len(unique_positions)} near-duplicate articles.")
+
     # --- 2. Create Embeddings ---
     # This converts our list of text snippets into a list of number vectors (embeddings)
+    # Vectors come back L2-normalized, and cached articles are not re-encoded.
     print("[INFO] Creating embeddings...")
     try:
-        embeddings = model.encode(texts, show_progress_bar=True)
+        embeddings = embed([texts[i] for i in unique_positions])
     except Exception as e:
         print(f"[ERROR] Failed to encode text: {e}")
         return articles
@@ -69,13 +281,12 @@ def group_by_theme(articles):
     # DBSCAN is great because we don't need to tell it *how many*
     # clusters to find. It finds them automatically.
 
-    # 'eps' is the "distance" to consider for a cluster.
-    # 'min_samples=2' means a theme needs at least 2 articles.
     print("[INFO] Running DBSCAN clustering...")
-    dbscan = DBSCAN(eps=0.25, min_samples=2, metric='cosine')
+    dbscan = DBSCAN(eps=DBSCAN_EPS, min_samples=DBSCAN_MIN_SAMPLES, metric='precomputed')
 
-    # Fit the model to our embeddings
-    dbscan.fit(embeddings)
+    # Fit the model to our (dense or sparse) distance matrix.
+    # The weights make a story with N copies count as N articles.
+    dbscan.fit(_distance_matrix(embeddings), sample_weight=weights)
 
     # Get the cluster labels (e.g., 0, 1, 2... -1 is noise)
     labels = dbscan.labels_
@@ -86,12 +297,14 @@ def group_by_theme(articles):
     num_clusters = len(set(labels)) - (1 if -1 in labels else 0)
     print(f"[INFO] Found {num_clusters} unique themes.")
 
-    for i, label in enumerate(labels):
+    for i, rep in enumerate(representatives):
         # The 'i' here is the index *within articles_to_cluster*
         # We get the *original* index from our 'original_indices' list
         original_article_index = original_indices[i]
 
+        # Duplicates share their representative's label.
         # Assign the cluster label as the theme_id (as an int)
+        label = labels[row_of[rep]]
         articles[original_article_index]['theme_id'] = int(label)
 
     end_time = time.time()
@@ -0,0 +1,63 @@
+import hashlib
+import re
+import numpy as np
+
+# --- Near-Duplicate Detection (SimHash) ---
+# News searches return the same wire story (AP, Reuters...) from many
+# outlets. A 64-bit SimHash of the opening text is enough to spot them
+# cheaply, before any expensive embedding work.
+
+SIMHASH_PREFIX_CHARS = 1024 # Only the start of the text is hashed
+SIMHASH_NGRAM = 3           # Word 3-grams
+MAX_HAMMING_DISTANCE = 3
+
+# 4 bands of 16 bits: two hashes within 3 bits of each other must agree
+# on at least one whole band, so we only compare hashes sharing a band.
+_BANDS = 4
+_BAND_BITS = 16
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+_WORD_RE = re.compile(r"\w+")
+
+def simhash(text):
+    """
+    64-bit SimHash over the word 3-grams of the start of 'text'.
+    """
+    words = _WORD_RE.findall(text[:SIMHASH_PREFIX_CHARS].lower())
+    count = max(1, len(words) - SIMHASH_NGRAM + 1)
+    grams = [" ".join(words[i:i + SIMHASH_NGRAM]) for i in range(count)]
+
+    digests = b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+
+    # Each bit of the result is the majority vote of that bit over all n-grams
+    votes = bits.sum(axis=0) * 2 > len(grams)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+class NearDuplicateIndex:
+    """
+    Groups texts whose SimHashes are within MAX_HAMMING_DISTANCE bits.
+    """
+    def __init__(self):
+        self._hashes = []
+        self._buckets = [{} for _ in range(_BANDS)]
+
+    def add(self, text):
+        """
+        Adds 'text' and returns the position of the earlier text it duplicates,
+        or its own position (the order of add() calls) if it is new.
+        """
+        h = simhash(text)
+        bands = [(h >> (b * _BAND_BITS)) & _BAND_MASK for b in range(_BANDS)]
+
+        for bucket, band in zip(self._buckets, bands):
+            for candidate in bucket.get(band, ()):
+                if (self._hashes[candidate] ^ h).bit_count() <= MAX_HAMMING_DISTANCE:
+                    self._hashes.append(self._hashes[candidate])
+                    return candidate
+
+        position = len(self._hashes)
+        self._hashes.append(h)
+        for bucket, band in zip(self._buckets, bands):
+            bucket.setdefault(band, []).append(position)
+        return position
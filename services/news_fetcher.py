@@ -1,8 +1,14 @@
 import asyncio
 import httpx  # The async-capable requests library
+import multiprocessing
+import orjson
 import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
+from readability import Document as RDoc
+from selectolax.lexbor import LexborHTMLParser
 
 # Load your .env file to get the API key
 load_dotenv()
@@ -11,8 +17,58 @@ NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 if not NEWS_API_KEY:
     print("ERROR: NEWS_API_KEY not found in .env file. Please add it.")
 
+# Max article scrapes in flight at once, overall and per news site.
+# Firing all 30 at once just trips rate limits and handshake storms.
+SCRAPE_CONCURRENCY = 10
+SCRAPE_CONCURRENCY_PER_HOST = 3
 
-async def fetch_news(query: str) -> list[dict]:
+# HTML parsing is CPU work. Done on the event loop it stalls every other
+# download; in a thread it still fights for the GIL. A small process pool
+# parses pages on other cores while the loop keeps downloading.
+#
+# The workers are forked at import time (end of this module). app.py
+# imports this module first, before any thread, model or event loop
+# exists, so the children are small and can't inherit a held lock. (Forking later, on the
+# first parse, would copy the loop/Flask/ONNX threads' locks; spawn or
+# forkserver workers would re-import app.py - models and all - in each.)
+# Where fork doesn't exist (Windows) we fall back to threads.
+PARSE_WORKERS = 4
+
+def _new_parse_pool():
+    try:
+        pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("fork"))
+    except ValueError:
+        return ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="parse")
+    pool.submit(int) # With fork, the first submit starts every worker
+    return pool
+
+_PARSE_POOL = None # Created at the bottom of this module
+
+def _reset_parse_pool():
+    global _PARSE_POOL
+    _PARSE_POOL = None
+
+# A forked child (a parse worker, or e.g. a gunicorn worker forked from a
+# preloaded master) can't use its parent's pool; it makes its own if needed.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_parse_pool)
+
+def _parse_pool():
+    """
+    Returns the parse pool (creating one if this process doesn't have one).
+    """
+    global _PARSE_POOL
+    if _PARSE_POOL is None:
+        _PARSE_POOL = _new_parse_pool()
+    return _PARSE_POOL
+
+# Some outlets serve multi-MB pages, and one of those stalls the whole
+# gather. The article body sits well inside the first 512KB, so we stop
+# reading there (and don't download non-HTML links at all).
+MAX_PAGE_BYTES = 512_000
+
+
+async def fetch_news(client: httpx.AsyncClient, query: str) -> list[dict]:
     """
     Fetches real news articles from NewsAPI.org.
     This replaces the dummy function.
@@ -32,32 +88,31 @@ async def fetch_news(query: str) -> list[dict]:
     }
 
     try:
-        # Use httpx.AsyncClient for our async app
-        async with httpx.AsyncClient() as client:
-            print(f"[INFO] Fetching real news from NewsAPI.org for: {query}")
-            response = await client.get(api_url, params=params, timeout=10.0)
-            
-            # Raise an error if the request failed
-            response.raise_for_status() 
-            
-            data = response.json()
-            
-            # --- IMPORTANT ---
-            # We now return the list of article objects directly.
-            # NewsAPI gives us the 'url', 'title', and 'description' (snippet)
-            # so we don't need a separate list of dummy URLs.
-            
-            articles = []
-            for item in data.get("articles", []):
-                articles.append({
-                    "title": item.get("title"),
-                    "url": item.get("url"),
-                    "snippet": item.get("description"), # 'description' is the snippet
-                    "source_name": item.get("source", {}).get("name"),
-                    "published_at": item.get("publishedAt")
-                })
-            
-            return articles
+        # Use the shared httpx.AsyncClient so the connection is reused
+        print(f"[INFO] Fetching real news from NewsAPI.org for: {query}")
+        response = await client.get(api_url, params=params, timeout=10.0)
+        
+        # Raise an error if the request failed
+        response.raise_for_status() 
+        
+        # orjson parses the raw bytes directly (faster than response.json())
+        data = orjson.loads(response.content)
+        
+        # --- IMPORTANT ---
+        # We now return the list of article objects directly.
+        # NewsAPI gives us the 'url', 'title', and 'description' (snippet)
+        # so we don't need a separate list of dummy URLs.
+        
+        return [
+            {
+                "title": item.get("title"),
+                "url": item.get("url"),
+                "snippet": item.get("description"), # 'description' is the snippet
+                "source_name": item.get("source", {}).get("name"),
+                "published_at": item.get("publishedAt")
+            }
+            for item in data.get("articles", [])
+        ]
 
     except httpx.HTTPStatusError as e:
         print(f"[ERROR] NewsAPI HTTP Error: {e.response.status_code} - {e.response.text}")
@@ -66,6 +121,26 @@ async def fetch_news(query: str) -> list[dict]:
         print(f"[ERROR] Failed to fetch news: {e}")
         return []
 
+def _parse_body(content: bytes) -> str:
+    """
+    Returns the main article text of an HTML page. Runs in _PARSE_POOL.
+    """
+    # Most pages are padded with nav/footer/related-links boilerplate, which
+    # turns into extra RAG chunks (and embedding calls) for nothing.
+    # readability-lxml cuts the page down to the main content first.
+    try:
+        main_html = RDoc(content).summary(html_partial=True)
+        text = LexborHTMLParser(main_html).text(separator=' ', strip=True)
+        if text:
+            return text
+    except Exception:
+        pass  # Fall back to the whole body below
+
+    # selectolax (lexbor) is a C HTML5 parser: no Python object per node, so it
+    # is much faster than BeautifulSoup when all we want is the text.
+    tree = LexborHTMLParser(content)
+    return tree.body.text(separator=' ', strip=True) if tree.body else ""
+
 # --- This is the function that runs in parallel ---
 async def fetch_one_article(client: httpx.AsyncClient, url: str) -> dict:
     """
@@ -73,13 +148,23 @@ async def fetch_one_article(client: httpx.AsyncClient, url: str) -> dict:
     """
     try:
         # 1. The async request. 'await' pauses this function
-        #    until the request is complete, letting others run.
-        response = await client.get(url, timeout=10.0)
+        #    while the page streams in, letting others run.
+        async with client.stream("GET", url, timeout=10.0) as response:
+            content_type = response.headers.get("content-type", "")
+            if "html" not in content_type:
+                raise ValueError(f"not an HTML page ({content_type or 'no content-type'})")
+
+            content = bytearray()
+            async for chunk in response.aiter_bytes():
+                content.extend(chunk)
+                if len(content) >= MAX_PAGE_BYTES:
+                    del content[MAX_PAGE_BYTES:]
+                    break
         
-        # 2. Parse the content
+        # 2. Parse the content (in another process - see _PARSE_POOL)
         # TODO: Replace this simple parser with your robust scraping logic
-        soup = BeautifulSoup(response.text, 'html.parser')
-        full_text = soup.body.get_text(separator=' ', strip=True)
+        loop = asyncio.get_running_loop()
+        full_text = await loop.run_in_executor(_parse_pool(), _parse_body, bytes(content))
         
         # Simulate extracting other data
         snippet = full_text[:150] + "..."
@@ -104,46 +189,54 @@ async def fetch_one_article(client: httpx.AsyncClient, url: str) -> dict:
         }
 
 # --- This is the main function we will call from app.py ---
-async def fetch_all_articles(query: str) -> list[dict]:
+async def fetch_all_articles(client: httpx.AsyncClient, query: str,
+                             text_queue: asyncio.Queue | None = None) -> list[dict]:
     """
     Orchestrates the entire process:
     1. Fetches article list from NewsAPI.
     2. Scrapes full text for each article in parallel.
     3. Merges the data.
+
+    'client' is the long-lived client owned by app.py, so its connection
+    pool (and keep-alive sockets) carry over between queries.
+    If 'text_queue' is given, each article's full text is put on it as soon
+    as that article is scraped (used to start embedding early).
     """
     
     # 1. Get the list of articles (with metadata) from NewsAPI
-    articles_from_api = await fetch_news(query)
+    articles_from_api = await fetch_news(client, query)
     
     if not articles_from_api:
         print("[INFO] No articles found by NewsAPI.")
         return []
 
-    # 2. Create an async client to manage all connections
-    async with httpx.AsyncClient() as client:
-        
-        # 3. Create a list of "tasks" - one for each URL.
-        tasks = []
-        for article in articles_from_api:
-            tasks.append(fetch_one_article(client, article['url']))
-            
-        # 4. Run all tasks concurrently and gather the results.
-        print(f"Starting parallel scrape for {len(tasks)} articles...")
-        scraped_results = await asyncio.gather(*tasks)
-        print("...Parallel scrape complete.")
+    semaphore = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(SCRAPE_CONCURRENCY_PER_HOST))
+
+    async def scrape(url):
+        async with host_semaphores[urlparse(url).netloc], semaphore:
+            result = await fetch_one_article(client, url)
+        if text_queue is not None and result['status'] == 'success':
+            await text_queue.put(result['full_text'])
+        return result
+
+    # 2. Create a list of "tasks" - one for each URL.
+    tasks = []
+    for article in articles_from_api:
+        tasks.append(scrape(article['url']))
         
-    # 5. Merge the API data (title, source) with the scraped data (full_text)
-    scraped_map = {res['url']: res for res in scraped_results if res['status'] == 'success'}
-    
-    final_articles = []
-    for api_article in articles_from_api:
-        url = api_article['url']
+    # 3. Run all tasks concurrently and gather the results.
+    print(f"Starting parallel scrape for {len(tasks)} articles...")
+    scraped_results = await asyncio.gather(*tasks)
+    print("...Parallel scrape complete.")
         
-        if url in scraped_map:
-            scraped_data = scraped_map[url]
-            merged_article = api_article.copy() 
-            merged_article['full_text'] = scraped_data['full_text']
-            merged_article['snippet'] = scraped_data['snippet'] 
-            final_articles.append(merged_article)
-
-    return final_articles
\ No newline at end of file
+    # 4. Merge the API data (title, source) with the scraped data (full_text).
+    #    gather() keeps the input order, so result i belongs to article i.
+    return [
+        {**api_article, 'full_text': scraped['full_text'], 'snippet': scraped['snippet']}
+        for api_article, scraped in zip(articles_from_api, scraped_results)
+        if scraped['status'] == 'success'
+    ]
+
+# Fork the parse workers last, so they get the fully loaded module
+_PARSE_POOL = _new_parse_pool()
@@ -1,5 +1,15 @@
+import asyncio
+import atexit
+import hashlib
+import math
 import os
 import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import faiss
+import numpy as np
 from dotenv import load_dotenv
 
 # --- LangChain Imports ---
@@ -7,9 +17,10 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.prompts import PromptTemplate
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
+
+from services.dedup import NearDuplicateIndex
 
 # --- Load API Key ---
 load_dotenv()
@@ -27,6 +38,67 @@ except Exception as e:
     embeddings_model = None
 
 
+# --- Vector Store Cache ---
+# The report, timeline and contradictions endpoints are usually called
+# back to back for the same articles. We keep the last few vector stores
+# (keyed by the article set), so the chunks are only embedded once.
+VECTOR_STORE_CACHE_SIZE = 16
+_vector_store_cache = OrderedDict()
+_vector_store_cache_lock = threading.Lock()
+
+# The text splitter is stateless, so one instance serves every call
+_SPLITTER = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
+
+# The embeddings API accepts up to 100 texts per request
+EMBEDDING_BATCH_SIZE = 100
+
+# From this many chunks up we use an IVF index, which only searches the
+# 'nprobe' closest clusters of vectors instead of scanning all of them.
+# Its vectors are stored as 8-bit scalars: 4x less memory than float32.
+IVF_MIN_CHUNKS = 200
+IVF_NPROBE = 10
+
+# --- Global Embedding Store ---
+# Related queries keep pulling in the same articles, and every new article
+# set used to re-embed all of its chunks. Every chunk we embed is also added
+# to one FAISS store on disk, keyed by sha1(url + chunk), so a chunk is only
+# ever embedded once - across queries and across restarts.
+# The directory is anchored to the project, not the working directory, as
+# we unpickle whatever is in it. Past GLOBAL_STORE_MAX_CHUNKS chunks
+# (~3KB each) the oldest ones are dropped, so it can't grow forever.
+GLOBAL_STORE_DIR = os.getenv(
+    "RAG_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "faiss_global")
+)
+GLOBAL_STORE_MAX_CHUNKS = 50_000
+GLOBAL_STORE_TRIM_TO = 40_000 # trim with some headroom, so we don't rebuild on every add
+GLOBAL_STORE_SAVE_INTERVAL = 60 # seconds between saves to disk
+_global_store = None
+_global_positions = {} # chunk key -> row in _global_store.index
+_global_store_dirty = False
+_global_store_saved_at = 0.0
+_global_store_lock = asyncio.Lock() # held while the store is changed or saved
+
+if embeddings_model is not None and os.path.isdir(GLOBAL_STORE_DIR):
+    try:
+        # We wrote this pickle ourselves (see _save_global_store)
+        _global_store = FAISS.load_local(GLOBAL_STORE_DIR, embeddings_model, allow_dangerous_deserialization=True)
+        _global_positions = {key: pos for pos, key in _global_store.index_to_docstore_id.items()}
+        print(f"[INFO] RAG: Loaded {len(_global_positions)} stored chunk embeddings.")
+    except Exception as e:
+        print(f"[WARN] RAG: Could not load the global embedding store: {e}")
+
+# --- Response Cache ---
+# Clicking "run again" (or asking almost the same question) over the same
+# articles would replay the whole retrieve + LLM pipeline. Answers are kept
+# for 10 minutes, keyed by (query, article set, prompt). A different query
+# whose embedding is within cosine 0.95 of a cached one also counts as a hit.
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL = 600 # seconds
+SEMANTIC_CACHE_MIN_SIMILARITY = 0.95
+_response_cache = OrderedDict() # key -> (created_at, scope, query_vector, response)
+
+
 # --- START: NEW PROMPT TEMPLATES ---
 
 # 1. The Main Report Prompt (Our old prompt, renamed)
@@ -93,51 +165,201 @@ ANALYSIS OF CONFLICTING INFORMATION:
 
 # --- START: NEW REUSABLE FUNCTIONS ---
 
-def _build_vector_store(articles):
+def _article_set_key(articles):
+    """
+    Private function. A hash identifying the set of articles a store is built from.
+    """
+    parts = sorted(
+        f"{article.get('url', '')}\t{len(article['full_text'])}"
+        for article in articles
+        if article.get('full_text') and len(article['full_text']) >= 100
+    )
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+def _create_faiss_store(texts, vectors, metadatas):
+    """
+    Private function. Wraps precomputed vectors in a LangChain FAISS store.
+    Small sets get the default exact (flat) index, bigger ones an 8-bit IVF index.
+    """
+    if len(texts) < IVF_MIN_CHUNKS:
+        return FAISS.from_embeddings(list(zip(texts, vectors)), embeddings_model, metadatas=metadatas)
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    dim = matrix.shape[1]
+    # ~sqrt(N) clusters, but faiss wants at least 39 training points per cluster
+    nlist = max(1, min(100, int(math.sqrt(len(matrix))), len(matrix) // 39))
+
+    quantizer = faiss.IndexFlatL2(dim)
+    index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit)
+    index.train(matrix)
+    index.add(matrix)
+    index.nprobe = IVF_NPROBE
+
+    ids = [str(uuid.uuid4()) for _ in texts]
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=text, metadata=metadata)
+        for doc_id, text, metadata in zip(ids, texts, metadatas)
+    })
+    return FAISS(
+        embedding_function=embeddings_model,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(ids))
+    )
+
+def _chunk_key(chunk):
+    """
+    Private function. Identifies a chunk of a given article in the global store.
+    """
+    return hashlib.sha1(f"{chunk.metadata.get('source', '')}\0{chunk.page_content}".encode("utf-8")).hexdigest()
+
+def _add_to_global_store(keys, texts, vectors, metadatas):
+    """
+    Private function. Adds newly embedded chunks to the global store.
+    """
+    global _global_store, _global_store_dirty
+
+    # Another request may have embedded some of these while we were waiting
+    new = [i for i, key in enumerate(keys) if key not in _global_positions]
+    if not new:
+        return
+
+    text_embeddings = [(texts[i], vectors[i]) for i in new]
+    new_keys = [keys[i] for i in new]
+    new_metadatas = [metadatas[i] for i in new]
+    if _global_store is None:
+        start = 0
+        _global_store = FAISS.from_embeddings(text_embeddings, embeddings_model, metadatas=new_metadatas, ids=new_keys)
+    else:
+        start = _global_store.index.ntotal
+        _global_store.add_embeddings(text_embeddings, metadatas=new_metadatas, ids=new_keys)
+
+    _global_positions.update({key: start + i for i, key in enumerate(new_keys)})
+    _global_store_dirty = True
+
+    if _global_store.index.ntotal > GLOBAL_STORE_MAX_CHUNKS:
+        _trim_global_store()
+
+def _trim_global_store():
+    """
+    Private function. Rebuilds the global store from its newest
+    GLOBAL_STORE_TRIM_TO chunks (rows are in insertion order).
+    """
+    global _global_store, _global_positions
+    total = _global_store.index.ntotal
+    first = total - GLOBAL_STORE_TRIM_TO
+
+    keys = [_global_store.index_to_docstore_id[pos] for pos in range(first, total)]
+    docs = [_global_store.docstore.search(key) for key in keys]
+    vectors = _global_store.index.reconstruct_n(first, total - first)
+
+    _global_store = FAISS.from_embeddings(
+        [(doc.page_content, vector) for doc, vector in zip(docs, vectors)],
+        embeddings_model,
+        metadatas=[doc.metadata for doc in docs],
+        ids=keys
+    )
+    _global_positions = {key: pos for pos, key in enumerate(keys)}
+    print(f"[INFO] RAG: Trimmed the global embedding store from {total} to {len(keys)} chunks.")
+
+def _save_global_store():
+    """
+    Private function. Writes the global store to disk if it changed.
+    """
+    global _global_store_dirty, _global_store_saved_at
+    if _global_store is None or not _global_store_dirty:
+        return
+    try:
+        _global_store.save_local(GLOBAL_STORE_DIR)
+        _global_store_dirty = False
+        _global_store_saved_at = time.time()
+    except Exception as e:
+        print(f"[WARN] RAG: Could not save the global embedding store: {e}")
+
+async def _asave_global_store():
+    """
+    Private function. Saves the global store at most once per interval.
+    The write runs in a thread, so the shared event loop keeps serving
+    scrapes and RAG calls; the lock keeps the store unchanged meanwhile.
+    """
+    if not _global_store_dirty or time.time() - _global_store_saved_at < GLOBAL_STORE_SAVE_INTERVAL:
+        return
+    async with _global_store_lock:
+        await asyncio.to_thread(_save_global_store)
+
+atexit.register(_save_global_store)
+
+async def _abuild_vector_store(articles):
     """
     Private function. Takes articles, chunks them, and builds a FAISS vector store.
+    Stores are cached per article set, so repeat calls skip the embedding step.
     """
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
-    all_chunks = []
-    
-    for article in articles:
-        text = article.get('full_text')
-        if not text or len(text) < 100:
-            continue
-            
-        metadata = {
+    key = _article_set_key(articles)
+    with _vector_store_cache_lock:
+        if key in _vector_store_cache:
+            _vector_store_cache.move_to_end(key)
+            print("[INFO] RAG: Reusing cached vector store.")
+            return _vector_store_cache[key]
+
+    usable = [article for article in articles if article.get('full_text') and len(article['full_text']) >= 100]
+    metadatas = [
+        {
             "source": article.get('url', ''),
             "title": article.get('title', 'No Title'),
             "theme_id": article.get('theme_id', -1),
             "snippet": article.get('snippet', '')
         }
-        
-        chunks = text_splitter.split_text(text)
-        for chunk_text in chunks:
-            all_chunks.append(Document(page_content=chunk_text, metadata=metadata))
+        for article in usable
+    ]
+
+    # One splitter call for all articles; each chunk gets its article's metadata
+    all_chunks = _SPLITTER.create_documents([article['full_text'] for article in usable], metadatas=metadatas)
+
+    # Syndicated stories give us the same chunk from several outlets.
+    # Keep only the first copy: fewer embedding calls, more varied sources.
+    duplicates = NearDuplicateIndex()
+    all_chunks = [chunk for i, chunk in enumerate(all_chunks) if duplicates.add(chunk.page_content) == i]
 
     if not all_chunks:
         return None # Return None if no chunks were made
 
+    texts = [chunk.page_content for chunk in all_chunks]
+    metadatas = [chunk.metadata for chunk in all_chunks]
+    chunk_keys = [_chunk_key(chunk) for chunk in all_chunks]
+
     try:
-        vector_store = FAISS.from_documents(all_chunks, embeddings_model)
-        print(f"[INFO] RAG: Built vector store from {len(all_chunks)} chunks.")
-        return vector_store
+        # Chunks we have embedded before come straight out of the global store
+        vectors = [None] * len(texts)
+        for i, chunk_key in enumerate(chunk_keys):
+            if chunk_key in _global_positions:
+                vectors[i] = _global_store.index.reconstruct(_global_positions[chunk_key])
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        # Embed the rest in full-size batches (one API request per 100 chunks),
+        # with all the batch requests in flight at the same time
+        missing_texts = [texts[i] for i in missing]
+        batches = [missing_texts[start:start + EMBEDDING_BATCH_SIZE] for start in range(0, len(missing_texts), EMBEDDING_BATCH_SIZE)]
+        batch_vectors = await asyncio.gather(*(embeddings_model.aembed_documents(batch) for batch in batches))
+        for i, vector in zip(missing, (vector for batch in batch_vectors for vector in batch)):
+            vectors[i] = vector
+
+        if missing:
+            async with _global_store_lock:
+                _add_to_global_store([chunk_keys[i] for i in missing], missing_texts,
+                                     [vectors[i] for i in missing], [metadatas[i] for i in missing])
+            await _asave_global_store()
+
+        vector_store = _create_faiss_store(texts, vectors, metadatas)
+        print(f"[INFO] RAG: Built vector store from {len(all_chunks)} chunks ({len(missing)} newly embedded).")
     except Exception as e:
         print(f"[ERROR] RAG: Failed to create FAISS vector store: {e}")
         return None
 
-def _create_retrieval_chain(vector_store, prompt_template_string):
-    """
-    Private function. Builds a retrieval chain from a vector store and prompt string.
-    """
-    retriever = vector_store.as_retriever(search_kwargs={"k": 10}) # Use top 10 chunks
-    
-    prompt = PromptTemplate(template=prompt_template_string, input_variables=["context", "input"])
-    
-    qa_chain = create_stuff_documents_chain(llm, prompt)
-    retrieval_chain = create_retrieval_chain(retriever, qa_chain)
-    return retrieval_chain
+    with _vector_store_cache_lock:
+        _vector_store_cache[key] = vector_store
+        while len(_vector_store_cache) > VECTOR_STORE_CACHE_SIZE:
+            _vector_store_cache.popitem(last=False)
+    return vector_store
 
 def _format_response(response):
     """
@@ -163,51 +385,240 @@ def _format_response(response):
         "sources": sources
     }
 
+def _response_scope(store_key, prompt_template):
+    """
+    Private function. Identifies "this prompt over this article set".
+    """
+    return hashlib.sha1(f"{store_key}|{prompt_template}".encode("utf-8")).hexdigest()
+
+def _lookup_response(query, scope, query_vector=None):
+    """
+    Private function. Returns (cached_response_or_None, key).
+    Tries an exact match first, then (given the query's unit vector) the
+    most similar cached query in 'scope'.
+    """
+    key = hashlib.sha1(f"{query}|{scope}".encode("utf-8")).hexdigest()
+
+    # Drop expired entries (oldest first)
+    now = time.time()
+    while _response_cache and now - next(iter(_response_cache.values()))[0] > RESPONSE_CACHE_TTL:
+        _response_cache.popitem(last=False)
+
+    if key in _response_cache:
+        print("[INFO] RAG: Response cache hit.")
+        return _response_cache[key][3], key
+
+    if query_vector is None:
+        return None, key
+
+    best_similarity, best_response = 0.0, None
+    for _, entry_scope, vector, response in _response_cache.values():
+        if entry_scope == scope and vector is not None:
+            similarity = float(vector @ query_vector)
+            if similarity > best_similarity:
+                best_similarity, best_response = similarity, response
+
+    if best_similarity >= SEMANTIC_CACHE_MIN_SIMILARITY:
+        print(f"[INFO] RAG: Semantic cache hit (similarity {best_similarity:.3f}).")
+        return best_response, key
+
+    return None, key
+
+async def _aembed_query(query):
+    """
+    Private function. Embeds the query once per RAG call: the vector is used
+    for both the semantic cache and the FAISS search. None on failure.
+    """
+    try:
+        return np.asarray(await embeddings_model.aembed_query(query), dtype=np.float32)
+    except Exception as e:
+        print(f"[ERROR] RAG: Could not embed query: {e}")
+        return None
+
+def _store_response(key, scope, query_vector, response):
+    """
+    Private function. Caches a successful RAG response.
+    """
+    if response["answer"].startswith("Error:"):
+        return
+    _response_cache[key] = (time.time(), scope, query_vector, response)
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > RESPONSE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
+
 # --- END: NEW REUSABLE FUNCTIONS ---
 
 
 # --- START: NEW PUBLIC FUNCTIONS (Called by app.py) ---
 
-def _run_rag_query(query, articles, prompt_template):
+async def _aretrieve(vector_store, query_vector):
     """
-    Master function to run any RAG query.
+    Returns the top 10 chunks for an already-embedded query.
+    """
+    return await vector_store.asimilarity_search_by_vector(query_vector.tolist(), k=10)
+
+def _format_prompt(prompt_template, docs, query):
+    """
+    Fills a prompt template with the retrieved chunks (joined the same way
+    the stuff-documents chain joins them) and the query.
+    """
+    prompt = PromptTemplate(template=prompt_template, input_variables=["context", "input"])
+    return prompt.format(context="\n\n".join(doc.page_content for doc in docs), input=query)
+
+async def _ainvoke_prompt(prompt_template, docs, query):
+    """
+    Runs one prompt over already-retrieved documents and formats its output.
     """
-    if llm is None or embeddings_model is None:
-        return {"answer": "Error: RAG models are not loaded.", "sources": []}
-    
-    # 1. Build Vector Store (Fast, in-memory)
-    vector_store = _build_vector_store(articles)
-    if vector_store is None:
-        return {"answer": "No articles with enough content to build an answer.", "sources": []}
-    
-    # 2. Build Chain (Fast)
-    retrieval_chain = _create_retrieval_chain(vector_store, prompt_template)
-    
-    # 3. Query (This is the main "thinking" part)
-    print(f"[INFO] RAG: Invoking chain with query: '{query}'")
     try:
-        response = retrieval_chain.invoke({"input": query})
+        message = await llm.ainvoke(_format_prompt(prompt_template, docs, query))
     except Exception as e:
         print(f"[ERROR] RAG: Pipeline query failed: {e}")
         return {"answer": "Error: The AI query failed.", "sources": []}
-    
-    # 4. Format and Return
-    return _format_response(response)
+
+    return _format_response({"answer": message.content, "context": docs})
+
+async def _run_multi_prompt(query, articles, prompts):
+    """
+    Master function to run RAG prompts over the same query.
+    'prompts' maps a name to a prompt template; returns a name -> response dict.
+    Cached answers are reused; everything else shares one query embedding
+    and one retrieval.
+    """
+    if llm is None or embeddings_model is None:
+        return {name: {"answer": "Error: RAG models are not loaded.", "sources": []} for name in prompts}
+
+    # 0. Answered this recently? (exact match needs no embedding)
+    store_key = _article_set_key(articles)
+    scopes = {name: _response_scope(store_key, template) for name, template in prompts.items()}
+    results, keys = {}, {}
+    for name, scope in scopes.items():
+        cached, keys[name] = _lookup_response(query, scope)
+        if cached is not None:
+            results[name] = cached
+    if len(results) == len(prompts):
+        return results
+
+    # 1. Embed the query once - for the semantic cache and the FAISS search
+    query_vector = await _aembed_query(query)
+    if query_vector is None:
+        return {name: results.get(name, {"answer": "Error: The AI query failed.", "sources": []}) for name in prompts}
+    unit_vector = query_vector / np.linalg.norm(query_vector)
+
+    # ...or something very close?
+    for name, scope in scopes.items():
+        if name not in results:
+            cached, _ = _lookup_response(query, scope, unit_vector)
+            if cached is not None:
+                results[name] = cached
+    missing = [name for name in prompts if name not in results]
+    if not missing:
+        return {name: results[name] for name in prompts}
+
+    # 2. Build Vector Store (Fast, in-memory)
+    vector_store = await _abuild_vector_store(articles)
+    if vector_store is None:
+        return {name: {"answer": "No articles with enough content to build an answer.", "sources": []} for name in prompts}
+
+    # 3. Retrieve once for all prompts
+    print(f"[INFO] RAG: Retrieving once for {len(missing)} prompt(s), query: '{query}'")
+    try:
+        docs = await _aretrieve(vector_store, query_vector)
+    except Exception as e:
+        print(f"[ERROR] RAG: Retrieval failed: {e}")
+        return {name: results.get(name, {"answer": "Error: The AI query failed.", "sources": []}) for name in prompts}
+
+    # 4. Query and format (This is the main "thinking" part)
+    responses = await asyncio.gather(*(_ainvoke_prompt(prompts[name], docs, query) for name in missing))
+    for name, response in zip(missing, responses):
+        _store_response(keys[name], scopes[name], unit_vector, response)
+        results[name] = response
+
+    return {name: results[name] for name in prompts}
+
+async def _run_rag_query(query, articles, prompt_template):
+    """
+    Runs a single RAG prompt.
+    """
+    return (await _run_multi_prompt(query, articles, {"answer": prompt_template}))["answer"]
 
 
 # Function for the main /query endpoint
-def get_summary_report(query, articles):
+async def get_summary_report(query, articles):
     print("[INFO] RAG: Generating Summary Report...")
-    return _run_rag_query(query, articles, REPORT_PROMPT_TEMPLATE)
+    return await _run_rag_query(query, articles, REPORT_PROMPT_TEMPLATE)
+
+# Function for the /api/summary/stream endpoint
+async def stream_summary_report(query, articles):
+    """
+    Streaming version of get_summary_report.
+    Yields {"token": ...} for each piece of the answer as Gemini writes it,
+    then one {"answer": ..., "sources": [...]} with the complete response.
+    """
+    print("[INFO] RAG: Streaming Summary Report...")
+    if llm is None or embeddings_model is None:
+        yield {"answer": "Error: RAG models are not loaded.", "sources": []}
+        return
+
+    scope = _response_scope(_article_set_key(articles), REPORT_PROMPT_TEMPLATE)
+    cached, key = _lookup_response(query, scope)
+    if cached is None:
+        query_vector = await _aembed_query(query)
+        if query_vector is None:
+            yield {"answer": "Error: The AI query failed.", "sources": []}
+            return
+        unit_vector = query_vector / np.linalg.norm(query_vector)
+        cached, _ = _lookup_response(query, scope, unit_vector)
+    if cached is not None:
+        yield {"token": cached["answer"]}
+        yield cached
+        return
+
+    vector_store = await _abuild_vector_store(articles)
+    if vector_store is None:
+        yield {"answer": "No articles with enough content to build an answer.", "sources": []}
+        return
+
+    print(f"[INFO] RAG: Streaming answer for query: '{query}'")
+    answer = []
+    try:
+        docs = await _aretrieve(vector_store, query_vector)
+        async for chunk in llm.astream(_format_prompt(REPORT_PROMPT_TEMPLATE, docs, query)):
+            if chunk.content:
+                answer.append(chunk.content)
+                yield {"token": chunk.content}
+    except Exception as e:
+        print(f"[ERROR] RAG: Pipeline query failed: {e}")
+        yield {"answer": "Error: The AI query failed.", "sources": []}
+        return
+
+    response = _format_response({"answer": "".join(answer), "context": docs})
+    _store_response(key, scope, unit_vector, response)
+    yield response
 
 # Function for the new /api/timeline endpoint
-def get_timeline(query, articles):
+async def get_timeline(query, articles):
     print("[INFO] RAG: Generating Timeline...")
-    return _run_rag_query(query, articles, TIMELINE_PROMPT_TEMPLATE)
+    return await _run_rag_query(query, articles, TIMELINE_PROMPT_TEMPLATE)
 
 # Function for the new /api/contradictions endpoint
-def get_contradictions(query, articles):
+async def get_contradictions(query, articles):
     print("[INFO] RAG: Finding Contradictions...")
-    return _run_rag_query(query, articles, CONTRADICTIONS_PROMPT_TEMPLATE)
+    return await _run_rag_query(query, articles, CONTRADICTIONS_PROMPT_TEMPLATE)
+
+# Function for the /api/reports endpoint (all three at once)
+async def get_all_reports(query, articles):
+    """
+    Builds the vector store and retrieves once, then runs the report,
+    timeline and contradictions prompts at the same time.
+    Returns {"report": ..., "timeline": ..., "contradictions": ...}.
+    """
+    print("[INFO] RAG: Generating all reports...")
+    templates = {
+        "report": REPORT_PROMPT_TEMPLATE,
+        "timeline": TIMELINE_PROMPT_TEMPLATE,
+        "contradictions": CONTRADICTIONS_PROMPT_TEMPLATE
+    }
+
+    return await _run_multi_prompt(query, articles, templates)
 
 # --- END: NEW PUBLIC FUNCTIONS ---
\ No newline at end of file